@@ -1,16 +1,106 @@
 import streamlit as st
 import math
 import pandas as pd
-from datetime import date
+from datetime import date, datetime, timedelta
 import pdfkit
 import tempfile
 import base64
 import numpy as np
 import os
 import shutil
+import time
+import uuid
+import re
+import hashlib
+import json
+import csv
+import io
+import zipfile
+import openpyxl
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+from pyarrow import fs
 
 # Today's date
 st.set_page_config(page_title="J4 Energy Solutions - Solar Investment Calculator", layout="wide")
+
+# --- Profiling ---
+# Off unless ?profile=N (or J4_PROFILE=N) is set; then the next N reruns, or PDF renders
+# with ?profile_scope=pdf (J4_PROFILE_SCOPE=pdf), are sampled and saved as speedscope files
+PROFILE_DIR = os.environ.get("J4_PROFILE_DIR", "profiles")
+PROFILE_MAX_RUNS = 10  # Most runs a single ?profile=N request can capture
+PROFILE_MAX_FILES = 50  # Older profile files are removed past this
+profile_request = st.query_params.get("profile") or os.environ.get("J4_PROFILE", "")
+profile_scope = st.query_params.get("profile_scope") or os.environ.get("J4_PROFILE_SCOPE", "rerun")
+
+if profile_request.isdigit() and st.session_state.get("profile_request") != (profile_request, profile_scope):
+    st.session_state.profile_request = (profile_request, profile_scope)
+    st.session_state.profiles_remaining = min(int(profile_request), PROFILE_MAX_RUNS)
+
+def discard_active_profiler():
+    # A run cut short by a rerun or an exception never reached save_profile; stop its profiler
+    # so the next profiled run on this script thread can start one
+    profiler = st.session_state.pop("active_profiler")
+    if profiler.is_running:
+        try:
+            profiler.stop()
+        except RuntimeError:
+            pass  # Started on a script thread that has since finished
+
+if "active_profiler" in st.session_state:
+    discard_active_profiler()
+
+def start_profiler(scope):
+    if scope != profile_scope or st.session_state.get("profiles_remaining", 0) <= 0:
+        return None
+    from pyinstrument import Profiler
+    profiler = Profiler(interval=0.001)
+    profiler.start()
+    st.session_state.active_profiler = profiler
+    return profiler
+
+def get_top_functions(session, limit=15):
+    self_times = {}
+    frames = [session.root_frame()] if session.root_frame() else []
+    while frames:
+        frame = frames.pop()
+        frames.extend(frame.children)
+        if frame.is_synthetic:
+            continue
+        key = (frame.function, frame.code_position_short())
+        self_times[key] = self_times.get(key, 0) + frame.total_self_time
+    top_functions = sorted(self_times.items(), key=lambda item: item[1], reverse=True)[:limit]
+    return [
+        {"Function": function, "Location": location, "Self Time (s)": round(self_time, 4)}
+        for (function, location), self_time in top_functions
+    ]
+
+def save_profile(profiler):
+    from pyinstrument.renderers import SpeedscopeRenderer
+    st.session_state.pop("active_profiler", None)
+    session = profiler.stop()
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    profile_path = os.path.join(
+        PROFILE_DIR, f"{profile_scope}-{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}.speedscope.json"
+    )
+    with open(profile_path, "w") as profile_file:
+        profile_file.write(SpeedscopeRenderer().render(session))
+    saved_profiles = sorted(
+        (os.path.join(PROFILE_DIR, name) for name in os.listdir(PROFILE_DIR) if name.endswith(".speedscope.json")),
+        key=os.path.getmtime,
+    )
+    for old_profile in saved_profiles[:-PROFILE_MAX_FILES]:
+        os.remove(old_profile)
+    st.session_state.profiles_remaining -= 1
+    st.session_state.setdefault("profile_results", []).append({
+        "scope": profile_scope,
+        "path": profile_path,
+        "duration": session.duration,
+        "top_functions": get_top_functions(session),
+    })
+
+rerun_profiler = start_profiler("rerun")
 today = date.today().strftime("%m/%d/%Y")
 
 # --- HEADER ---
@@ -134,6 +224,58 @@ st.markdown("---")
 # --- ITEMIZED COSTS ---
 st.header("Itemized Costs")
 
+# Default rates for the remaining line items (per watt, per panel/unit, or flat cost)
+default_rates = {
+    "solarinsure_rate": 0.10,
+    "enphase_rate": 190.00,
+    "labor_buyup_rate": 6.00,
+    "envoy_cost": 585.47,
+    "boxes_cost": 1200.00,
+    "ground_screw_rate": 230.00,  # Ground mount only
+    "dirt_work_cost": 2000.00,  # Ground mount only
+    "underground_cost": 200.00,
+    "permits_cost": 900.00,
+    "labor_rate": 0.69,
+}
+
+# Rate behind each line item and how its total is figured: per panel, per watt, or a flat cost
+itemized_cost_rates = {
+    "Panels": ("cost_per_panel", "panel"),
+    "Solarinsure": ("solarinsure_rate", "watt"),
+    "A/C Trunk Cable": ("trunk_rate", "panel"),
+    "Enphase Micros": ("enphase_rate", "panel"),
+    "Enphase 10yr Labor Buy Up": ("labor_buyup_rate", "panel"),
+    "Envoy-S Metered": ("envoy_cost", "flat"),
+    "Boxes and Hardware": ("boxes_cost", "flat"),
+    "Racking and Hardware": ("racking_rate", "panel"),
+    "Ground Screw Costs": ("ground_screw_rate", "panel"),
+    "Dirt Work": ("dirt_work_cost", "flat"),
+    "Underground Location": ("underground_cost", "flat"),
+    "Permits": ("permits_cost", "flat"),
+    "Labor": ("labor_rate", "watt"),
+}
+
+def calculate_item_total(label, rate, total_panels, output_watts):
+    basis = itemized_cost_rates[label][1]
+    if basis == "panel":
+        return total_panels * rate
+    elif basis == "watt":
+        return output_watts * rate
+    return rate
+
+# Line items shown on the form but not carried into the fixed project cost
+excluded_from_fixed_cost = ["Dirt Work"]
+
+def calculate_itemized_costs(item_rates, total_panels, output_watts):
+    return {
+        label: calculate_item_total(label, item_rates[rate_key], total_panels, output_watts)
+        for label, (rate_key, _) in itemized_cost_rates.items()
+    }
+
+def calculate_fixed_project_cost(itemized_costs, additional_total):
+    included_totals = [total for label, total in itemized_costs.items() if label not in excluded_from_fixed_cost]
+    return sum(included_totals) + additional_total
+
 # Default cost lookup by panel type
 panel_cost_lookup = {
     "Qcell Qtron+ 425w cell Blk/blk": 230,
@@ -169,7 +311,7 @@ with col2:
     cost_per_panel = float(cost_per_panel_str) if cost_per_panel_str.strip() else 0
 
 with col3:
-    panel_cost_total = total_panels_calc * cost_per_panel
+    panel_cost_total = calculate_item_total("Panels", cost_per_panel, total_panels_calc, output_watts)
     panels_cost_str = st.text_input("Total", value=f"${panel_cost_total:.2f}", key="panels_cost")
 
     # Solarinsure line item
@@ -179,11 +321,11 @@ with col1:
     st.write("**Solarinsure**")
 
 with col2:
-    solarinsure_rate_str = st.text_input("Cost per Watt", value="0.10", key="solarinsure_rate")
+    solarinsure_rate_str = st.text_input("Cost per Watt", value=f"{default_rates['solarinsure_rate']:.2f}", key="solarinsure_rate")
     solarinsure_rate = float(solarinsure_rate_str) if solarinsure_rate_str.strip() else 0
 
 with col3:
-    solarinsure_total = output_watts * solarinsure_rate
+    solarinsure_total = calculate_item_total("Solarinsure", solarinsure_rate, total_panels_calc, output_watts)
     solarinsure_total_str = st.text_input("Total", value=f"${solarinsure_total:,.2f}", key="solarinsure_total")
 
 # A/C Trunk Cable cost per panel lookup
@@ -216,7 +358,7 @@ with col2:
     trunk_rate = float(trunk_rate_str) if trunk_rate_str.strip() else 0
 
 with col3:
-    trunk_total = total_panels_calc * trunk_rate
+    trunk_total = calculate_item_total("A/C Trunk Cable", trunk_rate, total_panels_calc, output_watts)
     trunk_total_str = st.text_input("Total", value=f"${trunk_total:,.2f}", key="trunk_total")
 
 col1, col2, col3 = st.columns([1, 1, 1])
@@ -225,11 +367,11 @@ with col1:
     st.write("**Enphase Micros IQ-8+ (300-watt) / IQ8A with 445's**")
 
 with col2:
-    enphase_rate_str = st.text_input("Cost per Unit", value="190.00", key="enphase_rate")
+    enphase_rate_str = st.text_input("Cost per Unit", value=f"{default_rates['enphase_rate']:.2f}", key="enphase_rate")
     enphase_rate = float(enphase_rate_str) if enphase_rate_str.strip() else 0
 
 with col3:
-    enphase_total = total_panels_calc * enphase_rate
+    enphase_total = calculate_item_total("Enphase Micros", enphase_rate, total_panels_calc, output_watts)
     enphase_total_str = st.text_input("Total", value=f"${enphase_total:,.2f}", key="enphase_total")
 
 col1, col2, col3 = st.columns([1, 1, 1])
@@ -238,11 +380,11 @@ with col1:
     st.write("**Enphase 10yr Labor Buy Up**")
 
 with col2:
-    labor_buyup_rate_str = st.text_input("Cost per Panel", value="6.00", key="labor_buyup_rate")
+    labor_buyup_rate_str = st.text_input("Cost per Panel", value=f"{default_rates['labor_buyup_rate']:.2f}", key="labor_buyup_rate")
     labor_buyup_rate = float(labor_buyup_rate_str) if labor_buyup_rate_str.strip() else 0
 
 with col3:
-    labor_buyup_total = total_panels_calc * labor_buyup_rate
+    labor_buyup_total = calculate_item_total("Enphase 10yr Labor Buy Up", labor_buyup_rate, total_panels_calc, output_watts)
     labor_buyup_total_str = st.text_input("Total", value=f"${labor_buyup_total:,.2f}", key="labor_buyup_total")
 
 col1, col2, col3 = st.columns([1, 1, 1])
@@ -251,7 +393,7 @@ with col1:
     st.write("**Envoy-S Metered with 10-year monitoring**")
 
 with col2:
-    envoy_cost_str = st.text_input("Cost", value="585.47", key="envoy_cost")
+    envoy_cost_str = st.text_input("Cost", value=f"{default_rates['envoy_cost']:.2f}", key="envoy_cost")
     envoy_cost = float(envoy_cost_str) if envoy_cost_str.strip() else 0
 
 with col3:
@@ -263,7 +405,7 @@ with col1:
     st.write("**Boxes and Hardware**")
 
 with col2:
-    boxes_cost_str = st.text_input("Cost", value="1200.00", key="boxes_cost")
+    boxes_cost_str = st.text_input("Cost", value=f"{default_rates['boxes_cost']:.2f}", key="boxes_cost")
     boxes_cost = float(boxes_cost_str) if boxes_cost_str.strip() else 0
 
 with col3:
@@ -299,13 +441,13 @@ with col2:
     racking_rate = float(racking_rate_str) if racking_rate_str.strip() else 0
 
 with col3:
-    racking_total = total_panels_calc * racking_rate
+    racking_total = calculate_item_total("Racking and Hardware", racking_rate, total_panels_calc, output_watts)
     racking_total_str = st.text_input("Total", value=f"${racking_total:,.2f}", key="racking_total")
 
 # --- Ground Screw Costs ---
 
 # Set ground screw rate based on selected panel
-default_ground_screw_rate = 230.00 if selected_panel == "Fixed Ground SunModo racking with Jinko 425w (Even numbers only)" else 0.00
+default_ground_screw_rate = default_rates["ground_screw_rate"] if selected_panel == "Fixed Ground SunModo racking with Jinko 425w (Even numbers only)" else 0.00
 
 col1, col2, col3 = st.columns([1, 1, 1])
 
@@ -317,13 +459,13 @@ with col2:
     ground_screw_rate = float(ground_screw_rate_str) if ground_screw_rate_str.strip() else 0
 
 with col3:
-    ground_screw_total = total_panels_calc * ground_screw_rate
+    ground_screw_total = calculate_item_total("Ground Screw Costs", ground_screw_rate, total_panels_calc, output_watts)
     ground_screw_total_str = st.text_input("Total", value=f"${ground_screw_total:,.2f}", key="ground_screw_total")
 
 # --- Dirt Work ---
 
 # Set default Dirt Work flat cost
-default_dirt_work_cost = 2000.00 if selected_panel == "Fixed Ground SunModo racking with Jinko 425w (Even numbers only)" else 0.00
+default_dirt_work_cost = default_rates["dirt_work_cost"] if selected_panel == "Fixed Ground SunModo racking with Jinko 425w (Even numbers only)" else 0.00
 
 col1, col2, col3 = st.columns([1, 1, 1])
 
@@ -342,10 +484,10 @@ col1, col2, col3 = st.columns([1, 1, 1])
 with col1:
     st.write("**Underground Location**")
 with col2:
-    underground_cost_str = st.text_input("Cost", value="200.00", key="underground_cost")
+    underground_cost_str = st.text_input("Cost", value=f"{default_rates['underground_cost']:.2f}", key="underground_cost")
     underground_cost = float(underground_cost_str.strip()) if underground_cost_str.strip() else 0
 with col3:
-    underground_total = underground_cost
+    underground_total = calculate_item_total("Underground Location", underground_cost, total_panels_calc, output_watts)
     st.text_input("Total", value=f"${underground_total:,.2f}", key="underground_total", disabled=True)
 
 # --- Permits ---
@@ -353,15 +495,15 @@ col1, col2, col3 = st.columns([1, 1, 1])
 with col1:
     st.write("**Permits**")
 with col2:
-    permits_cost_str = st.text_input("Cost", value="900.00", key="permits_cost")
+    permits_cost_str = st.text_input("Cost", value=f"{default_rates['permits_cost']:.2f}", key="permits_cost")
     permits_cost = float(permits_cost_str.strip()) if permits_cost_str.strip() else 0
 with col3:
-    permits_total = permits_cost
+    permits_total = calculate_item_total("Permits", permits_cost, total_panels_calc, output_watts)
     st.text_input("Total", value=f"${permits_total:,.2f}", key="permits_total", disabled=True)
 
 # --- Labor ---
 
-default_labor_rate = 0.69
+default_labor_rate = default_rates["labor_rate"]
 
 col1, col2, col3 = st.columns([1, 1, 1])
 
@@ -373,7 +515,7 @@ with col2:
     labor_rate = float(labor_rate_str) if labor_rate_str.strip() else 0
 
 with col3:
-    labor_total = output_watts * labor_rate
+    labor_total = calculate_item_total("Labor", labor_rate, total_panels_calc, output_watts)
     labor_total_str = st.text_input("Total", value=f"${labor_total:,.2f}", key="labor_total")
 
 # --- Additional Costs ---
@@ -412,22 +554,24 @@ for item in additional_cost_items:
 
 # --- TOTAL PROJECT COST ---
 
-# Collect all itemized cost variables (assuming these have been defined earlier)
-itemized_totals = [
-    panel_cost_total,
-    solarinsure_total,
-    trunk_total,
-    enphase_total,
-    labor_buyup_total,
-    envoy_cost,
-    boxes_cost,
-    racking_total,
-    ground_screw_total if 'ground_screw_total' in locals() else 0,
-    dirt_work_total if 'dirt_work_total' in locals() else 0,
-    underground_total, 
-    permits_total, 
-    labor_total if 'labor_total' in locals() else 0,
-]
+# Collect the rates entered above and total each line item
+item_rates = {
+    "cost_per_panel": cost_per_panel,
+    "solarinsure_rate": solarinsure_rate,
+    "trunk_rate": trunk_rate,
+    "enphase_rate": enphase_rate,
+    "labor_buyup_rate": labor_buyup_rate,
+    "envoy_cost": envoy_cost,
+    "boxes_cost": boxes_cost,
+    "racking_rate": racking_rate,
+    "ground_screw_rate": ground_screw_rate,
+    "dirt_work_cost": dirt_work_cost,
+    "underground_cost": underground_cost,
+    "permits_cost": permits_cost,
+    "labor_rate": labor_rate,
+}
+
+itemized_costs = calculate_itemized_costs(item_rates, total_panels_calc, output_watts)
 
 # Additional manual costs from text_inputs
 additional_total = 0
@@ -439,7 +583,7 @@ for item in additional_cost_items:
         pass  # Ignore invalid inputs
 
 # Calculate grand total
-grand_total = sum(itemized_totals) + additional_total
+grand_total = calculate_fixed_project_cost(itemized_costs, additional_total)
 
 # Display total row
 st.markdown("---")
@@ -453,15 +597,27 @@ with col3:
 
 # --- Total Project Cost ---
 
+# Default $/watt by pricing tier
+per_watt_tiers = {
+    "Ground Mount": 1.40,
+    "Under 12kW": 3.05,
+    "12kW-18kW": 2.98,
+    "18kW and Up": 2.90,
+}
+
+def get_per_watt_tier(panel, watts):
+    if panel == "Fixed Ground SunModo racking with Jinko 425w (Even numbers only)":
+        return "Ground Mount"
+    elif watts < 12000:
+        return "Under 12kW"
+    elif 12000 <= watts < 18000:
+        return "12kW-18kW"
+    else:
+        return "18kW and Up"
+
 # Determine default $/watt based on logic
-if selected_panel == "Fixed Ground SunModo racking with Jinko 425w (Even numbers only)":
-    default_per_watt = 1.40
-elif output_watts < 12000:
-    default_per_watt = 3.05
-elif 12000 <= output_watts < 18000:
-    default_per_watt = 2.98
-else:
-    default_per_watt = 2.90
+per_watt_tier = get_per_watt_tier(selected_panel, output_watts)
+default_per_watt = per_watt_tiers[per_watt_tier]
 
 # Input for per watt cost (manually adjustable)
 col1, col2, col3 = st.columns([1, 1, 1])
@@ -511,42 +667,238 @@ row_labels = [
 
 column_labels = ["Client Funded", "15yr Financed", "20yr Financed"]
 
-# --- Calculations ---
-customer_cost = total_project_cost
-customer_cost_dep = total_project_cost-deposit_amount
-cost_per_watt = total_project_cost / output_watts if output_watts else 0
-sales_based_commission = total_project_cost * 0.12
-
-fixed_job_cost = grand_total
-
-margin_above_fixed = (total_project_cost * 0.95) - fixed_job_cost
-margin_percent = (margin_above_fixed / fixed_job_cost) * 100
-federal_tax_credit = total_project_cost * 0.30
-net_customer_cost = customer_cost - federal_tax_credit
-net_customer_cost_dep = customer_cost - federal_tax_credit - deposit_amount
-
 financed_w_itc_idx = row_labels.index("Financed Payment Amount w/ITC (Estimate Only)")
 financed_wo_itc_idx = row_labels.index("Financed Payment Amount w/o ITC (Estimate Only)")
 rate_idx = row_labels.index("Rate")
 
+# Commission, margin, tax credit and loan terms used throughout the pricing
+pricing_constants = {
+    "sales_commission_rate": 0.12,
+    "margin_cost_factor": 0.95,
+    "federal_tax_credit_rate": 0.30,
+    "itc_principal_factor": 0.7,
+    "loan_years_15": 15,
+    "loan_years_20": 20,
+    "loan_years_15_itc": 13,
+    "loan_years_20_itc": 19,
+}
+
 def calculate_monthly_payment(principal, annual_rate, years):
     monthly_rate = annual_rate / 100 / 12
     n = years * 12
     payment = principal * (monthly_rate + monthly_rate / ((1 + monthly_rate) ** n - 1))
     return payment
 
-principal_ITC = net_customer_cost * .7
-principal = net_customer_cost_dep
-annual_rate_15 = rate_15yr
-annual_rate_20 = rate_20yr
-years_15_ITC = 13
-years_20_ITC = 19
-years_15 = 15
-years_20 = 20
-pymt_15_itc = f"${calculate_monthly_payment(principal_ITC, annual_rate_15, years_15_ITC):,.2f}"
-pymt_20_itc = f"${calculate_monthly_payment(principal_ITC, annual_rate_20, years_20_ITC):,.2f}"
-pymt_15 = f"${calculate_monthly_payment(principal, annual_rate_15,years_15):,.2f}"
-pymt_20 = f"${calculate_monthly_payment(principal, annual_rate_20,years_20):,.2f}"
+def calculate_loan_payments(net_customer_cost, deposit_amount, annual_rate_15, annual_rate_20):
+    principal_ITC = net_customer_cost * pricing_constants["itc_principal_factor"]
+    principal = net_customer_cost - deposit_amount
+    years_15_ITC = pricing_constants["loan_years_15_itc"]
+    years_20_ITC = pricing_constants["loan_years_20_itc"]
+    years_15 = pricing_constants["loan_years_15"]
+    years_20 = pricing_constants["loan_years_20"]
+    return {
+        "payment_15_itc": calculate_monthly_payment(principal_ITC, annual_rate_15, years_15_ITC),
+        "payment_20_itc": calculate_monthly_payment(principal_ITC, annual_rate_20, years_20_ITC),
+        "payment_15": calculate_monthly_payment(principal, annual_rate_15, years_15),
+        "payment_20": calculate_monthly_payment(principal, annual_rate_20, years_20),
+    }
+
+def get_default_item_rates(panel):
+    is_ground_mount = panel == "Fixed Ground SunModo racking with Jinko 425w (Even numbers only)"
+    return {
+        "cost_per_panel": panel_cost_lookup.get(panel, 0),
+        "solarinsure_rate": default_rates["solarinsure_rate"],
+        "trunk_rate": trunk_cable_rate_lookup.get(panel, 0),
+        "enphase_rate": default_rates["enphase_rate"],
+        "labor_buyup_rate": default_rates["labor_buyup_rate"],
+        "envoy_cost": default_rates["envoy_cost"],
+        "boxes_cost": default_rates["boxes_cost"],
+        "racking_rate": racking_cost_lookup.get(panel, 0),
+        "ground_screw_rate": default_rates["ground_screw_rate"] if is_ground_mount else 0.00,
+        "dirt_work_cost": default_rates["dirt_work_cost"] if is_ground_mount else 0.00,
+        "underground_cost": default_rates["underground_cost"],
+        "permits_cost": default_rates["permits_cost"],
+        "labor_rate": default_rates["labor_rate"],
+    }
+
+def compute_quote(panel_size, total_panels, item_rates, cost_per_watt, rate_15yr, rate_20yr, deposit_amount=0.0, additional_total=0.0):
+    # Same pricing as the form above, without any widgets
+    output_watts = total_panels * panel_size
+    itemized_costs = calculate_itemized_costs(item_rates, total_panels, output_watts)
+    grand_total = calculate_fixed_project_cost(itemized_costs, additional_total)
+    total_project_cost = output_watts * cost_per_watt
+    margin_above_fixed = (total_project_cost * pricing_constants["margin_cost_factor"]) - grand_total
+    federal_tax_credit = total_project_cost * pricing_constants["federal_tax_credit_rate"]
+    net_customer_cost = total_project_cost - federal_tax_credit
+    quote = {
+        "output_watts": output_watts,
+        "itemized_costs": itemized_costs,
+        "additional_total": additional_total,
+        "grand_total": grand_total,
+        "total_project_cost": total_project_cost,
+        "cost_per_watt": total_project_cost / output_watts if output_watts else 0,
+        "sales_based_commission": total_project_cost * pricing_constants["sales_commission_rate"],
+        "margin_above_fixed": margin_above_fixed,
+        "margin_percent": (margin_above_fixed / grand_total) * 100,
+        "federal_tax_credit": federal_tax_credit,
+        "net_customer_cost": net_customer_cost,
+    }
+    quote.update(calculate_loan_payments(net_customer_cost, deposit_amount, rate_15yr, rate_20yr))
+    return quote
+
+# --- Standard Quote Table ---
+# Every catalog panel at 10-60 panels and each per-watt tier, priced at default rates,
+# stored as a memory-mapped array so default-rate quotes are a single index read
+QUOTE_TABLE_DIR = os.environ.get("J4_QUOTE_TABLE_DIR", "quote_table")
+QUOTE_TABLE_VERSION = 2  # Bump whenever a formula in compute_quote or calculate_loan_payments changes
+quote_table_panels = list(panel_size_lookup)
+quote_table_panel_counts = range(10, 61)
+quote_table_tiers = list(per_watt_tiers)
+standard_loan_rates = [6.00 + 0.25 * step for step in range(25)]  # 6.00% - 12.00%
+quote_table_fields = (
+    ["output_watts"]
+    + list(itemized_cost_rates)
+    + [
+        "grand_total",
+        "total_project_cost",
+        "cost_per_watt",
+        "sales_based_commission",
+        "margin_above_fixed",
+        "margin_percent",
+        "federal_tax_credit",
+        "net_customer_cost",
+    ]
+)
+loan_payment_fields = ["payment_15_itc", "payment_20_itc", "payment_15", "payment_20"]
+
+def get_quote_table_fingerprint():
+    # Changes whenever the catalog, default rates, pricing constants or table layout change, which forces a rebuild
+    inputs = {
+        "version": QUOTE_TABLE_VERSION,
+        "pricing_constants": pricing_constants,
+        "itemized_cost_rates": itemized_cost_rates,
+        "excluded_from_fixed_cost": excluded_from_fixed_cost,
+        "panel_size_lookup": panel_size_lookup,
+        "default_item_rates": {panel: get_default_item_rates(panel) for panel in quote_table_panels},
+        "per_watt_tiers": per_watt_tiers,
+        "panel_counts": [quote_table_panel_counts.start, quote_table_panel_counts.stop],
+        "standard_loan_rates": standard_loan_rates,
+        "fields": quote_table_fields + loan_payment_fields,
+    }
+    return hashlib.sha256(json.dumps(inputs, sort_keys=True).encode()).hexdigest()[:16]
+
+def build_quote_table(path):
+    shape = (
+        len(quote_table_panels),
+        len(quote_table_panel_counts),
+        len(quote_table_tiers),
+        len(quote_table_fields) + len(standard_loan_rates) * len(loan_payment_fields),
+    )
+    staging_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    try:
+        table = np.lib.format.open_memmap(staging_path, mode="w+", dtype=np.float64, shape=shape)
+        for panel_idx, panel in enumerate(quote_table_panels):
+            item_rates = get_default_item_rates(panel)
+            for count_idx, total_panels in enumerate(quote_table_panel_counts):
+                for tier_idx, tier in enumerate(quote_table_tiers):
+                    quote = compute_quote(
+                        panel_size_lookup[panel],
+                        total_panels,
+                        item_rates,
+                        per_watt_tiers[tier],
+                        standard_loan_rates[0],
+                        standard_loan_rates[0],
+                    )
+                    row = [quote["output_watts"]] + [quote["itemized_costs"][label] for label in itemized_cost_rates]
+                    row += [quote[field] for field in quote_table_fields[len(row):]]
+                    for annual_rate in standard_loan_rates:
+                        payments = calculate_loan_payments(quote["net_customer_cost"], 0.0, annual_rate, annual_rate)
+                        row += [payments[field] for field in loan_payment_fields]
+                    table[panel_idx, count_idx, tier_idx] = row
+        table.flush()
+        del table
+        os.replace(staging_path, path)
+    except BaseException:
+        # Includes Streamlit's rerun/stop signals; a half-built table is never picked up, so drop it
+        if os.path.exists(staging_path):
+            os.remove(staging_path)
+        raise
+
+@st.cache_resource
+def load_quote_table(fingerprint):
+    path = os.path.join(QUOTE_TABLE_DIR, f"quote_table_{fingerprint}.npy")
+    if not os.path.exists(path):
+        os.makedirs(QUOTE_TABLE_DIR, exist_ok=True)
+        build_quote_table(path)
+        # Only tables built for an older fingerprint; in-progress .tmp files belong to other processes
+        for stale_table in os.listdir(QUOTE_TABLE_DIR):
+            if re.fullmatch(r"quote_table_[0-9a-f]+\.npy", stale_table) and stale_table != os.path.basename(path):
+                os.remove(os.path.join(QUOTE_TABLE_DIR, stale_table))
+    return np.load(path, mmap_mode="r")
+
+def lookup_standard_quote(panel, total_panels, item_rates, cost_per_watt, rate_15yr, rate_20yr, deposit_amount, additional_total):
+    # Returns None whenever a rate has been overridden so the caller prices the quote live
+    tier_rates = list(per_watt_tiers.values())
+    if (
+        panel not in panel_size_lookup
+        or total_panels not in quote_table_panel_counts
+        or item_rates != get_default_item_rates(panel)
+        or cost_per_watt not in tier_rates
+        or rate_15yr not in standard_loan_rates
+        or rate_20yr not in standard_loan_rates
+        or deposit_amount != 0
+        or additional_total != 0
+    ):
+        return None
+
+    row = load_quote_table(get_quote_table_fingerprint())[
+        quote_table_panels.index(panel),
+        quote_table_panel_counts.index(total_panels),
+        tier_rates.index(cost_per_watt),
+    ]
+    values = dict(zip(quote_table_fields, row.tolist()))
+    quote = {field: values.pop(field) for field in quote_table_fields if field not in itemized_cost_rates}
+    quote["itemized_costs"] = values
+    quote["additional_total"] = 0.0
+
+    payments_start = len(quote_table_fields)
+    payments_width = len(loan_payment_fields)
+    payments_15 = payments_start + standard_loan_rates.index(rate_15yr) * payments_width
+    payments_20 = payments_start + standard_loan_rates.index(rate_20yr) * payments_width
+    quote["payment_15_itc"] = float(row[payments_15 + loan_payment_fields.index("payment_15_itc")])
+    quote["payment_20_itc"] = float(row[payments_20 + loan_payment_fields.index("payment_20_itc")])
+    quote["payment_15"] = float(row[payments_15 + loan_payment_fields.index("payment_15")])
+    quote["payment_20"] = float(row[payments_20 + loan_payment_fields.index("payment_20")])
+    return quote
+
+# --- Calculations ---
+quote = lookup_standard_quote(
+    selected_panel, total_panels_calc, item_rates, cost_per_watt, rate_15yr, rate_20yr, deposit_amount, additional_total
+)
+if quote is None:
+    quote = compute_quote(
+        panel_size, total_panels_calc, item_rates, cost_per_watt, rate_15yr, rate_20yr, deposit_amount, additional_total
+    )
+
+customer_cost = quote["total_project_cost"]
+cost_per_watt = quote["cost_per_watt"]
+sales_based_commission = quote["sales_based_commission"]
+
+fixed_job_cost = quote["grand_total"]
+
+margin_above_fixed = quote["margin_above_fixed"]
+margin_percent = quote["margin_percent"]
+federal_tax_credit = quote["federal_tax_credit"]
+net_customer_cost = quote["net_customer_cost"]
+
+payment_15_itc = quote["payment_15_itc"]
+payment_20_itc = quote["payment_20_itc"]
+payment_15 = quote["payment_15"]
+payment_20 = quote["payment_20"]
+pymt_15_itc = f"${payment_15_itc:,.2f}"
+pymt_20_itc = f"${payment_20_itc:,.2f}"
+pymt_15 = f"${payment_15:,.2f}"
+pymt_20 = f"${payment_20:,.2f}"
 
 # --- Populate grid data with numeric values or np.nan ---
 grid_data = [
@@ -710,6 +1062,7 @@ options = {
 }
 
 if st.button("Download Proposal as PDF", key="download_proposal_pdf"):
+    pdf_profiler = start_profiler("pdf")
     html = generate_proposal_html()
 
     with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmpfile:
@@ -720,30 +1073,475 @@ if st.button("Download Proposal as PDF", key="download_proposal_pdf"):
 
     href = f'<a href="data:application/pdf;base64,{b64}" download="J4_Solar_Proposal.pdf">📥 Download Proposal PDF</a>'
     st.markdown(href, unsafe_allow_html=True)
-        
-    
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
 
+    if pdf_profiler is not None:
+        save_profile(pdf_profiler)
+
+# --- Quote Archive ---
+# Finished quotes are appended to a Parquet archive partitioned by month (quote_month=YYYY-MM)
+QUOTE_ARCHIVE_DIR = os.environ.get("J4_QUOTE_ARCHIVE", "quote_archive")
+
+def line_item_column(label):
+    return re.sub(r"[^a-z0-9]+", "_", label.lower()).strip("_")
+
+quote_archive_schema = pa.schema(
+    [
+        ("quote_id", pa.string()),
+        ("quote_date", pa.date32()),
+        ("quote_week", pa.date32()),
+        ("client_name", pa.string()),
+        ("client_address", pa.string()),
+        ("client_city", pa.string()),
+        ("client_state", pa.string()),
+        ("client_zip", pa.string()),
+        ("panel_type", pa.string()),
+        ("per_watt_tier", pa.string()),
+        ("total_panels", pa.int64()),
+        ("output_watts", pa.float64()),
+    ]
+    + [(line_item_column(label), pa.float64()) for label in itemized_costs]
+    + [
+        ("additional_total", pa.float64()),
+        ("grand_total", pa.float64()),
+        ("cost_per_watt", pa.float64()),
+        ("total_project_cost", pa.float64()),
+        ("deposit_amount", pa.float64()),
+        ("rate_15yr", pa.float64()),
+        ("rate_20yr", pa.float64()),
+        ("sales_based_commission", pa.float64()),
+        ("margin_above_fixed", pa.float64()),
+        ("margin_percent", pa.float64()),
+        ("federal_tax_credit", pa.float64()),
+        ("net_customer_cost", pa.float64()),
+        ("payment_15_itc", pa.float64()),
+        ("payment_20_itc", pa.float64()),
+        ("payment_15", pa.float64()),
+        ("payment_20", pa.float64()),
+        ("quote_month", pa.string()),
+    ]
+)
 
+quote_archive_partitioning = ds.partitioning(pa.schema([("quote_month", pa.string())]), flavor="hive")
+
+def build_quote_record():
+    quote_date = date.today()
+    record = {
+        "quote_id": uuid.uuid4().hex,
+        "quote_date": quote_date,
+        "quote_week": quote_date - timedelta(days=quote_date.weekday()),
+        "client_name": client_name,
+        "client_address": client_address,
+        "client_city": client_city,
+        "client_state": client_state,
+        "client_zip": client_zip,
+        "panel_type": final_panel_type,
+        "per_watt_tier": per_watt_tier,
+        "total_panels": int(total_panels_calc),
+        "output_watts": float(output_watts),
+    }
+    for label, total in itemized_costs.items():
+        record[line_item_column(label)] = float(total)
+    record.update({
+        "additional_total": float(additional_total),
+        "grand_total": float(grand_total),
+        "cost_per_watt": float(cost_per_watt),
+        "total_project_cost": float(total_project_cost),
+        "deposit_amount": float(deposit_amount),
+        "rate_15yr": float(rate_15yr),
+        "rate_20yr": float(rate_20yr),
+        "sales_based_commission": float(sales_based_commission),
+        "margin_above_fixed": float(margin_above_fixed),
+        "margin_percent": float(margin_percent),
+        "federal_tax_credit": float(federal_tax_credit),
+        "net_customer_cost": float(net_customer_cost),
+        "payment_15_itc": float(payment_15_itc),
+        "payment_20_itc": float(payment_20_itc),
+        "payment_15": float(payment_15),
+        "payment_20": float(payment_20),
+        "quote_month": quote_date.strftime("%Y-%m"),
+    })
+    return record
+
+def archive_quote(record):
+    table = pa.Table.from_pylist([record], schema=quote_archive_schema)
+    ds.write_dataset(
+        table,
+        QUOTE_ARCHIVE_DIR,
+        format="parquet",
+        partitioning=quote_archive_partitioning,
+        basename_template=f"{record['quote_id']}-{{i}}.parquet",
+        existing_data_behavior="overwrite_or_ignore",
+    )
+
+def open_quote_archive(path=QUOTE_ARCHIVE_DIR):
+    # Memory-mapped reads; only the columns a query asks for are decoded
+    return ds.dataset(
+        os.path.abspath(path),
+        format="parquet",
+        schema=quote_archive_schema,
+        partitioning=quote_archive_partitioning,
+        filesystem=fs.LocalFileSystem(use_mmap=True),
+    )
+
+COMPACTION_LOCK_TIMEOUT_SECONDS = 10 * 60  # A lock older than this was left by a crashed compaction
+
+def lock_quote_month(month_path):
+    # Exclusive per-month lock so two sessions never compact the same month at once; None if held
+    lock_path = os.path.join(month_path, ".compacting.lock")
+    try:
+        return os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+        pass
+    try:
+        if time.time() - os.path.getmtime(lock_path) < COMPACTION_LOCK_TIMEOUT_SECONDS:
+            return None
+        # Renaming is atomic, so only one session can break a stale lock
+        os.rename(lock_path, f"{lock_path}.{uuid.uuid4().hex}.stale")
+    except FileNotFoundError:
+        pass
+    try:
+        return os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+        return None
+
+def finish_month_compaction(month_path):
+    # Completes a compaction interrupted after its manifest was written, and drops
+    # merged files from one that stopped before; both are hidden from readers until renamed
+    manifest_path = os.path.join(month_path, ".compacting.manifest")
+    manifest = {"compacted": {}, "replaced": []}
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as manifest_file:
+            manifest = json.load(manifest_file)
+    for staged_name, compacted_name in manifest["compacted"].items():
+        if os.path.exists(os.path.join(month_path, staged_name)):
+            os.rename(os.path.join(month_path, staged_name), os.path.join(month_path, compacted_name))
+    for replaced_name in manifest["replaced"]:
+        try:
+            os.remove(os.path.join(month_path, replaced_name))
+        except FileNotFoundError:
+            pass
+    for name in os.listdir(month_path):
+        if name.startswith(".compacting-") or name.endswith(".stale") or name == ".compacting.manifest.tmp":
+            os.remove(os.path.join(month_path, name))
+    if os.path.exists(manifest_path):
+        os.remove(manifest_path)
+
+def compact_quote_month(month_path, month_schema):
+    finish_month_compaction(month_path)
+    quote_files = [name for name in os.listdir(month_path) if name.endswith(".parquet") and not name.startswith(".")]
+    if len(quote_files) < 2:
+        return
+    # Only the files listed here are replaced, so quotes saved meanwhile are kept
+    month_quotes = ds.dataset(
+        [os.path.join(month_path, name) for name in quote_files], format="parquet", schema=month_schema
+    )
+    staged_files = []
+    ds.write_dataset(
+        month_quotes,
+        month_path,
+        format="parquet",
+        basename_template=f".compacting-{uuid.uuid4().hex}-{{i}}.parquet",
+        existing_data_behavior="overwrite_or_ignore",
+        file_visitor=lambda written_file: staged_files.append(os.path.basename(written_file.path)),
+    )
+    # Once the manifest is in place an interrupted run is rolled forward by the next compaction
+    manifest = {
+        "compacted": {name: name.replace(".compacting-", "compacted-", 1) for name in staged_files},
+        "replaced": quote_files,
+    }
+    manifest_path = os.path.join(month_path, ".compacting.manifest")
+    with open(f"{manifest_path}.tmp", "w") as manifest_file:
+        json.dump(manifest, manifest_file)
+    os.replace(f"{manifest_path}.tmp", manifest_path)
+    finish_month_compaction(month_path)
+
+def compact_quote_archive():
+    # Each saved quote is its own small file; merge every month into one file so scans stay fast
+    month_schema = quote_archive_schema.remove(quote_archive_schema.get_field_index("quote_month"))
+    for month_dir in sorted(os.listdir(QUOTE_ARCHIVE_DIR)):
+        month_path = os.path.join(QUOTE_ARCHIVE_DIR, month_dir)
+        if not month_dir.startswith("quote_month="):
+            continue
+        lock = lock_quote_month(month_path)
+        if lock is None:
+            continue  # Another session is compacting this month
+        try:
+            compact_quote_month(month_path, month_schema)
+        finally:
+            os.close(lock)
+            os.remove(os.path.join(month_path, ".compacting.lock"))
+
+def get_archive_signature():
+    # File paths, sizes and mtimes; changes whenever a quote is saved or the archive is compacted
+    signature = []
+    for root, _, files in os.walk(QUOTE_ARCHIVE_DIR):
+        for name in files:
+            stat = os.stat(os.path.join(root, name))
+            signature.append((os.path.join(root, name), stat.st_size, stat.st_mtime_ns))
+    return tuple(sorted(signature))
+
+@st.cache_data(max_entries=4)
+def get_archive_rollups(archive_signature):
+    quotes = open_quote_archive().to_table(columns=[
+        "quote_id",
+        "quote_week",
+        "panel_type",
+        "per_watt_tier",
+        "total_project_cost",
+        "margin_percent",
+        "sales_based_commission",
+    ])
+    totals = {
+        "quotes": quotes.num_rows,
+        "pipeline_value": pc.sum(quotes["total_project_cost"]).as_py() or 0,
+        "average_margin_percent": pc.mean(quotes["margin_percent"]).as_py() or 0,
+        "commission_owed": pc.sum(quotes["sales_based_commission"]).as_py() or 0,
+    }
+    weekly = quotes.group_by("quote_week").aggregate([
+        ("quote_id", "count"),
+        ("total_project_cost", "sum"),
+        ("margin_percent", "mean"),
+        ("sales_based_commission", "sum"),
+    ]).sort_by([("quote_week", "descending")]).select(
+        ["quote_week", "quote_id_count", "total_project_cost_sum", "margin_percent_mean", "sales_based_commission_sum"]
+    )
+    panel_mix = quotes.group_by("panel_type").aggregate([
+        ("quote_id", "count"),
+        ("total_project_cost", "sum"),
+    ]).sort_by([("total_project_cost_sum", "descending")]).select(
+        ["panel_type", "quote_id_count", "total_project_cost_sum"]
+    )
+    tier_mix = quotes.group_by("per_watt_tier").aggregate([
+        ("quote_id", "count"),
+        ("total_project_cost", "sum"),
+    ]).sort_by([("total_project_cost_sum", "descending")]).select(
+        ["per_watt_tier", "quote_id_count", "total_project_cost_sum"]
+    )
+    return totals, weekly, panel_mix, tier_mix
 
+st.markdown("---")
+st.header("Quote Archive")
+
+if st.button("Save Quote to Archive", key="archive_quote"):
+    archive_quote(build_quote_record())
+    st.success("Quote saved to archive.")
+
+if st.checkbox("Show Archive Analytics", key="show_archive_analytics"):
+    if not os.path.isdir(QUOTE_ARCHIVE_DIR):
+        st.info("No quotes have been archived yet.")
+    else:
+        if st.button("Compact Archive", key="compact_archive"):
+            compact_quote_archive()
+
+        totals, weekly, panel_mix, tier_mix = get_archive_rollups(get_archive_signature())
+
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("Quotes", f"{totals['quotes']:,}")
+        col2.metric("Total Pipeline Value", f"${totals['pipeline_value']:,.2f}")
+        col3.metric("Average Margin %", f"{totals['average_margin_percent']:.2f}%")
+        col4.metric("Sales Based Commision Owed", f"${totals['commission_owed']:,.2f}")
+
+        st.subheader("Weekly Rollup")
+        df_weekly = weekly.to_pandas()
+        df_weekly.columns = ["Week Of", "Quotes", "Pipeline Value", "Average Margin %", "Commision Owed"]
+        st.dataframe(
+            df_weekly.style.format({
+                "Pipeline Value": "${:,.2f}",
+                "Average Margin %": "{:.2f}%",
+                "Commision Owed": "${:,.2f}",
+            }),
+            hide_index=True,
+        )
+
+        col1, col2 = st.columns(2)
+        with col1:
+            st.subheader("Mix by Panel Type")
+            df_panel_mix = panel_mix.to_pandas()
+            df_panel_mix.columns = ["Panel Type", "Quotes", "Pipeline Value"]
+            st.dataframe(df_panel_mix.style.format({"Pipeline Value": "${:,.2f}"}), hide_index=True)
+        with col2:
+            st.subheader("Mix by Per-Watt Tier")
+            df_tier_mix = tier_mix.to_pandas()
+            df_tier_mix.columns = ["Per-Watt Tier", "Quotes", "Pipeline Value"]
+            st.dataframe(df_tier_mix.style.format({"Pipeline Value": "${:,.2f}"}), hide_index=True)
+
+# --- Quote Export ---
+# Line items, financing grid and amortization schedules are written row by row,
+# so memory stays flat no matter how many quotes or months are exported
+def get_quote_loans(quote):
+    principal_wo_itc = quote["net_customer_cost"] - quote["deposit_amount"]
+    principal_w_itc = quote["net_customer_cost"] * pricing_constants["itc_principal_factor"]
+    return [
+        ("15yr Loan w/o ITC", principal_wo_itc, quote["rate_15yr"], pricing_constants["loan_years_15"]),
+        ("20yr Loan w/o ITC", principal_wo_itc, quote["rate_20yr"], pricing_constants["loan_years_20"]),
+        ("15yr Loan w/ ITC", principal_w_itc, quote["rate_15yr"], pricing_constants["loan_years_15_itc"]),
+        ("20yr Loan w/ ITC", principal_w_itc, quote["rate_20yr"], pricing_constants["loan_years_20_itc"]),
+    ]
+
+def amortization_schedule(principal, annual_rate, years):
+    monthly_rate = annual_rate / 100 / 12
+    payment = calculate_monthly_payment(principal, annual_rate, years)
+    balance = principal
+    for month in range(1, years * 12 + 1):
+        interest = balance * monthly_rate
+        principal_paid = payment - interest
+        balance -= principal_paid
+        yield month, payment, principal_paid, interest, max(balance, 0)
+
+def line_item_rows(quote):
+    for label in itemized_costs:
+        yield [quote["quote_id"], quote["client_name"], quote["quote_date"], label, quote[line_item_column(label)]]
+    yield [quote["quote_id"], quote["client_name"], quote["quote_date"], "Additional Costs", quote["additional_total"]]
+    yield [quote["quote_id"], quote["client_name"], quote["quote_date"], "Fixed Project Cost", quote["grand_total"]]
+    yield [quote["quote_id"], quote["client_name"], quote["quote_date"], "Total Project Cost", quote["total_project_cost"]]
+
+def financing_rows(quote):
+    yield [
+        quote["quote_id"],
+        quote["client_name"],
+        quote["quote_date"],
+        quote["total_project_cost"],
+        quote["cost_per_watt"],
+        quote["sales_based_commission"],
+        quote["margin_above_fixed"],
+        quote["margin_percent"],
+        quote["federal_tax_credit"],
+        quote["net_customer_cost"],
+        quote["deposit_amount"],
+        quote["payment_15"],
+        quote["payment_20"],
+        quote["payment_15_itc"],
+        quote["payment_20_itc"],
+        quote["rate_15yr"],
+        quote["rate_20yr"],
+    ]
+
+def amortization_rows(quote):
+    for loan, principal, annual_rate, years in get_quote_loans(quote):
+        for month, payment, principal_paid, interest, balance in amortization_schedule(principal, annual_rate, years):
+            yield [
+                quote["quote_id"],
+                quote["client_name"],
+                loan,
+                month,
+                round(payment, 2),
+                round(principal_paid, 2),
+                round(interest, 2),
+                round(balance, 2),
+            ]
+
+export_sheets = [
+    ("Line Items", ["Quote ID", "Client", "Quote Date", "Item", "Total"], line_item_rows),
+    (
+        "Financing",
+        [
+            "Quote ID", "Client", "Quote Date", "Customer Cost", "Cost per Watt", "Sales Based Commision",
+            "Margin Above Fixed Job Costs", "Margin %", "Federal Tax Credit", "Final NET Customer Cost",
+            "Deposit Amount", "15yr Loan w/o ITC", "20yr Loan w/o ITC", "15yr Loan w/ ITC", "20yr Loan w/ ITC",
+            "15-Year Rate (%)", "20-Year Rate (%)",
+        ],
+        financing_rows,
+    ),
+    (
+        "Amortization",
+        ["Quote ID", "Client", "Loan", "Month", "Payment", "Principal", "Interest", "Balance"],
+        amortization_rows,
+    ),
+]
 
+def iter_archived_quotes():
+    for batch in open_quote_archive().to_batches(batch_size=1024):
+        yield from batch.to_pylist()
 
+# Exports are served from disk by Streamlit's static file serving (app/static/...)
+EXPORT_DIR = os.path.join("static", "exports")
+EXPORT_MAX_AGE_SECONDS = 60 * 60
+MAX_STATIC_FILE_BYTES = 200 * 1024 * 1024  # Largest file Streamlit's static serving will send
+XLSX_MAX_ROWS = 1048576
 
+def remove_old_exports():
+    for name in os.listdir(EXPORT_DIR):
+        path = os.path.join(EXPORT_DIR, name)
+        try:
+            if time.time() - os.path.getmtime(path) > EXPORT_MAX_AGE_SECONDS:
+                os.remove(path)
+        except FileNotFoundError:
+            continue  # Another session removed it first
+
+def export_quotes(get_quotes, path, file_format):
+    # get_quotes returns a fresh iterator of quote records; each sheet takes its own pass
+    if file_format == "XLSX":
+        workbook = openpyxl.Workbook(write_only=True)
+        for sheet_name, header, get_rows in export_sheets:
+            sheet = workbook.create_sheet(sheet_name)
+            sheet.append(header)
+            sheet_rows = 1
+            sheet_number = 1
+            for quote in get_quotes():
+                for row in get_rows(quote):
+                    # Continue on "Amortization (2)", etc. once a sheet hits Excel's row limit
+                    if sheet_rows == XLSX_MAX_ROWS:
+                        sheet_number += 1
+                        sheet = workbook.create_sheet(f"{sheet_name} ({sheet_number})")
+                        sheet.append(header)
+                        sheet_rows = 1
+                    sheet.append(row)
+                    sheet_rows += 1
+        workbook.save(path)
+    else:
+        with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+            for sheet_name, header, get_rows in export_sheets:
+                with archive.open(f"{sheet_name.replace(' ', '_')}.csv", "w") as raw:
+                    with io.TextIOWrapper(raw, encoding="utf-8", newline="") as csvfile:
+                        writer = csv.writer(csvfile)
+                        writer.writerow(header)
+                        for quote in get_quotes():
+                            writer.writerows(get_rows(quote))
 
+st.markdown("---")
+st.header("Export Quotes")
 
+col1, col2, col3 = st.columns([1, 1, 1])
+with col1:
+    export_scope = st.selectbox("Quotes", ["This Quote", "All Archived Quotes"], key="export_scope")
+with col2:
+    export_format = st.selectbox("Format", ["XLSX", "CSV (zip)"], key="export_format")
 
+with col3:
+    st.write("")
+    build_export = st.button("Build Export", key="build_export")
+
+if build_export:
+    if export_scope == "All Archived Quotes" and not os.path.isdir(QUOTE_ARCHIVE_DIR):
+        st.info("No quotes have been archived yet.")
+    else:
+        if export_scope == "This Quote":
+            current_quote = build_quote_record()
+            get_export_quotes = lambda: iter([current_quote])
+        else:
+            get_export_quotes = iter_archived_quotes
+
+        suffix = ".xlsx" if export_format == "XLSX" else ".zip"
+        os.makedirs(EXPORT_DIR, exist_ok=True)
+        remove_old_exports()
+        export_name = f"{uuid.uuid4().hex}{suffix}"
+        export_path = os.path.join(EXPORT_DIR, export_name)
+        export_quotes(get_export_quotes, export_path, export_format)
+
+        if os.path.getsize(export_path) > MAX_STATIC_FILE_BYTES:
+            st.warning(f"Export is too large to download through the app. It was saved on the server at {export_path}.")
+        else:
+            href = f'<a href="app/static/exports/{export_name}" download="J4_Quotes{suffix}">📥 Download Export</a>'
+            st.markdown(href, unsafe_allow_html=True)
+
+# --- Profiler Results ---
+if rerun_profiler is not None:
+    save_profile(rerun_profiler)
+
+if st.session_state.get("profile_results"):
+    st.markdown("---")
+    with st.expander("Profiler", expanded=True):
+        st.caption(f"{st.session_state.profiles_remaining} profile(s) remaining. Open the saved files at https://www.speedscope.app")
+        for result in reversed(st.session_state.profile_results):
+            st.markdown(f"**{result['scope'].title()}** ({result['duration']:.3f}s) `{result['path']}`")
+            st.dataframe(pd.DataFrame(result["top_functions"]), hide_index=True)